@@ -25,7 +25,7 @@ def calculate_diffusivity(omega, sij_left, sij_right, diffusivity_bandwidth, phy
                           diffusivity_threshold=None):
     # TODO: cache this
     sigma = 2 * (diffusivity_bandwidth[:, np.newaxis] + diffusivity_bandwidth[np.newaxis, :])
-    physical_mode = physical_mode.astype(np.bool)
+    physical_mode = physical_mode.astype(np.bool_)
     delta_energy = omega[:, np.newaxis] - omega[np.newaxis, :]
     kernel = curve(delta_energy, sigma)
     if diffusivity_threshold is not None:
@@ -135,6 +135,7 @@ class Conductivity:
         self.tolerance = kwargs.pop('tolerance', None)
         self.folder = self.phonons.folder
         self.kpts = self.phonons.kpts
+        self.is_single_precision = self.phonons.is_single_precision
         self.n_k_points = self.phonons.n_k_points
         self.n_modes = self.phonons.n_modes
         self.n_phonons = self.phonons.n_phonons
@@ -239,7 +240,7 @@ class Conductivity:
         gamma_tensor = -1 * self.phonons._ps_gamma_and_gamma_tensor[:, 2:]
         index = np.outer(physical_mode, physical_mode)
         n_physical = physical_mode.sum()
-        log_size((n_physical, n_physical), np.float, name='_scattering_matrix')
+        log_size((n_physical, n_physical), np.float64, name='_scattering_matrix')
         gamma_tensor = gamma_tensor[index].reshape((n_physical, n_physical))
         if is_rescaling_population:
             n = self.phonons.population.reshape((self.n_phonons))[physical_mode]
@@ -302,7 +303,8 @@ class Conductivity:
                                        storage=self.storage,
                                        temperature=self.temperature,
                                        is_classic=self.is_classic,
-                                       is_unfolding=self.is_unfolding)
+                                       is_unfolding=self.is_unfolding,
+                                       is_single_precision=self.is_single_precision)
             heat_capacity_2d = phonon.heat_capacity_2d
             if phonons.n_modes > 100:
                 logging.info('calculating conductivity for q = ' + str(q_points[k_index]))
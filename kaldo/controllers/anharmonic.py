@@ -4,9 +4,8 @@ Anharmonic Lattice Dynamics
 """
 import numpy as np
 import ase.units as units
-from kaldo.helpers.tools import timeit
+from kaldo.helpers.tools import timeit, cached_contract
 import tensorflow as tf
-from opt_einsum import contract
 from kaldo.helpers.logger import get_logger, log_size
 from kaldo.controllers.dirac_kernel import gaussian_delta, triangular_delta, lorentz_delta
 logging = get_logger()
@@ -111,10 +110,13 @@ def project_crystal(phonons):
     second_minus = tf.math.conj(evect_tf)
     second_minus_chi = tf.math.conj(_chi_k)
     logging.info('Projection started')
-    population = phonons.population
     broadening_shape = phonons.broadening_shape
     physical_mode = phonons.physical_mode.reshape((phonons.n_k_points, phonons.n_modes))
     omega = phonons.omega
+    # Convert the per mode arrays once, instead of copying them to the device at each iteration
+    population_tf = tf.convert_to_tensor(phonons.population)
+    omega_tf = tf.convert_to_tensor(omega)
+    omega_flat_tf = tf.reshape(omega_tf, (-1, ))
     if not phonons.third_bandwidth:
         velocity_tf = tf.convert_to_tensor(phonons.velocity)
     gamma_to_thz = 1e11 * units.mol * (units.mol / (10 * units.J)) ** 2
@@ -126,7 +128,7 @@ def project_crystal(phonons):
         if is_sparse:
             third_nu_tf = tf.sparse.sparse_dense_matmul(third_tf, evect_tf[index_k, :, mu, tf.newaxis])
         else:
-            third_nu_tf = contract('ijk,i->jk', third_tf, evect_tf[index_k, :, mu], backend='tensorflow')
+            third_nu_tf = cached_contract('ijk,i->jk', third_tf, evect_tf[index_k, :, mu])
             third_nu_tf = tf.reshape(third_nu_tf, (n_replicas * n_replicas, phonons.n_modes, phonons.n_modes))
 
         third_nu_tf = tf.cast(
@@ -145,8 +147,8 @@ def project_crystal(phonons):
                 k_size = phonons.kpts
                 sigma_tf = calculate_broadening(velocity_tf, cellinv, k_size, index_kpp_full)
 
-            out = calculate_dirac_delta_crystal(omega,
-                                                population,
+            out = calculate_dirac_delta_crystal(omega_tf,
+                                                population_tf,
                                                 physical_mode,
                                                 sigma_tf,
                                                 broadening_shape,
@@ -185,7 +187,7 @@ def project_crystal(phonons):
             nup_vec = index_kp_vec * phonons.n_modes + mup_vec
             nupp_vec = index_kpp_vec * phonons.n_modes + mupp_vec
             pot_times_dirac = tf.cast(pot_times_dirac, dtype=tf.float64)
-            pot_times_dirac = pot_times_dirac / tf.gather(omega.flatten(), nup_vec) / tf.gather(omega.flatten(), nupp_vec)
+            pot_times_dirac = pot_times_dirac / tf.gather(omega_flat_tf, nup_vec) / tf.gather(omega_flat_tf, nupp_vec)
 
             if is_gamma_tensor_enabled:
                 # We need to use bincount together with fancy indexing here. See:
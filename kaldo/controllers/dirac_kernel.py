@@ -1,4 +1,3 @@
-import scipy.special
 import numpy as np
 from kaldo.helpers.logger import get_logger
 logging = get_logger()
@@ -3,6 +3,7 @@ kaldo
 Anharmonic Lattice Dynamics
 """
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from sparse import COO
 from kaldo.grid import wrap_coordinates
 from kaldo.observables.secondorder import SecondOrder
@@ -13,6 +14,26 @@ logging = get_logger()
 MAIN_FOLDER = 'displacement'
 
 
+def _take_flat(tensor, flat_index):
+    # Read the entries of a dense array or of a sparse COO tensor at the given C-order flat indices
+    if isinstance(tensor, COO):
+        sorted_loc = tensor.linear_loc()
+        data = tensor.data
+        # Canonical COO tensors are already sorted, sort only when needed
+        if (np.diff(sorted_loc) < 0).any():
+            order = np.argsort(sorted_loc)
+            sorted_loc = sorted_loc[order]
+            data = data[order]
+        values = np.zeros(flat_index.shape, dtype=tensor.dtype)
+        if sorted_loc.size == 0:
+            return values
+        position = np.minimum(np.searchsorted(sorted_loc, flat_index), sorted_loc.size - 1)
+        is_found = sorted_loc[position] == flat_index
+        values[is_found] = data[position[is_found]]
+        return values
+    return np.asarray(tensor).reshape(-1)[flat_index]
+
+
 class ForceConstants:
     """
     Class for constructing the finite difference object to calculate
@@ -55,7 +76,8 @@ class ForceConstants:
         self.n_modes = self.n_atoms * 3
         self.n_replicas = np.prod(supercell)
         self.n_replicated_atoms = self.n_replicas * self.n_atoms
-        self.cell_inv = np.linalg.inv(atoms.cell)
+        self._cell_inv = None
+        self._third_distance_squared_value = None
         self.folder = folder
         self.distance_threshold = distance_threshold
         self._list_of_replicas = None
@@ -77,6 +99,27 @@ class ForceConstants:
             logging.info('Using folded IFC matrices.')
 
 
+    @property
+    def cell_inv(self):
+        if self._cell_inv is None:
+            self._cell_inv = np.linalg.inv(self.atoms.cell)
+        return self._cell_inv
+
+
+    @property
+    def _third_distance_squared(self):
+        # Squared wrapped distances between the unit cell atoms and the atoms of the third order replicas
+        if self._third_distance_squared_value is None:
+            n_replicas = self.n_replicas
+            replicated_atoms = self.third.replicated_atoms
+            replicated_positions = replicated_atoms.positions.reshape((n_replicas, self.n_atoms, 3))
+            dxij_reduced = wrap_coordinates(self.atoms.positions[:, np.newaxis, np.newaxis, :]
+                                            - replicated_positions[np.newaxis, :, :, :], replicated_atoms.cell,
+                                            self.third.replicated_cell_inv)
+            self._third_distance_squared_value = np.einsum('ilja,ilja->ilj', dxij_reduced, dxij_reduced)
+        return self._third_distance_squared_value
+
+
     @classmethod
     def from_folder(cls, folder, supercell=(1, 1, 1), format='numpy', third_energy_threshold=0., third_supercell=None,
                     is_acoustic_sum=False, only_second=False, distance_threshold=None):
@@ -112,7 +155,20 @@ class ForceConstants:
     	ForceConstants object
 
         """
-        second_order = SecondOrder.load(folder=folder, supercell=supercell, format=format, is_acoustic_sum=is_acoustic_sum)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # The second and third order files are independent, parse them concurrently
+            second_future = executor.submit(SecondOrder.load, folder=folder, supercell=supercell, format=format,
+                                            is_acoustic_sum=is_acoustic_sum)
+            if not only_second:
+                if format == 'numpy':
+                    third_format = 'sparse'
+                else:
+                    third_format = format
+                if third_supercell is None:
+                    third_supercell = supercell
+                third_future = executor.submit(ThirdOrder.load, folder=folder, supercell=third_supercell,
+                                               format=third_format, third_energy_threshold=third_energy_threshold)
+            second_order = second_future.result()
         atoms = second_order.atoms
         # Create a finite difference object
         forceconstants = {'atoms': atoms,
@@ -121,16 +177,7 @@ class ForceConstants:
         forceconstants = cls(**forceconstants)
         forceconstants.second = second_order
         if not only_second:
-            if format == 'numpy':
-                third_format = 'sparse'
-            else:
-                third_format = format
-            if third_supercell is None:
-                third_supercell = supercell
-            third_order = ThirdOrder.load(folder=folder, supercell=third_supercell, format=third_format,
-                                          third_energy_threshold=third_energy_threshold)
-
-            forceconstants.third = third_order
+            forceconstants.third = third_future.result()
         forceconstants.distance_threshold = distance_threshold
         return forceconstants
 
@@ -166,36 +213,44 @@ class ForceConstants:
         if reduced_third is None:
             reduced_third = self.third.value
         n_unit_atoms = self.n_atoms
-        atoms = self.atoms
         n_replicas = self.n_replicas
-        replicated_cell_inv = np.linalg.inv(self.third.replicated_atoms.cell)
-
-        reduced_third = reduced_third.reshape(
-            (n_unit_atoms, 3, n_replicas, n_unit_atoms, 3, n_replicas, n_unit_atoms, 3))
-        replicated_positions = self.third.replicated_atoms.positions.reshape((n_replicas, n_unit_atoms, 3))
-        dxij_reduced = wrap_coordinates(atoms.positions[:, np.newaxis, np.newaxis, :]
-                                        - replicated_positions[np.newaxis, :, :, :], self.third.replicated_atoms.cell, replicated_cell_inv)
-        indices = np.argwhere(np.linalg.norm(dxij_reduced, axis=-1) < distance_threshold)
-
-        coords = []
-        values = []
-        for index in indices:
-            for l in range(n_replicas):
-                for j in range(n_unit_atoms):
-                    dx2 = dxij_reduced[index[0], l, j]
-
-                    is_storing = (np.linalg.norm(dx2) < distance_threshold)
-                    if is_storing:
-                        for alpha in range(3):
-                            for beta in range(3):
-                                for gamma in range(3):
-                                    coords.append([index[0], alpha, index[1], index[2], beta, l, j, gamma])
-                                    values.append(reduced_third[index[0], alpha, 0, index[2], beta, 0, j, gamma])
+        is_close = self._third_distance_squared < distance_threshold ** 2
+
+        # First pass: each atom i couples all the pairs of (l, j) replicas within the threshold,
+        # giving 27 entries per pair, so the buffers can be allocated at their final size.
+        n_close = is_close.reshape((n_unit_atoms, -1)).sum(axis=1)
+        n_entries = 27 * int((n_close ** 2).sum())
+        shape = (n_unit_atoms, 3, n_replicas, n_unit_atoms, 3, n_replicas, n_unit_atoms, 3)
+        coords = np.empty((8, n_entries), dtype=np.int32)
+        reduced_index = np.empty(n_entries, dtype=np.intp)
+        alpha, beta, gamma = np.indices((3, 3, 3)).reshape((3, -1))
+
+        # Second pass: fill the buffers one atom at a time, to keep the temporaries small
+        cursor = 0
+        for i in range(n_unit_atoms):
+            close_l, close_j = np.nonzero(is_close[i])
+            n_block = 27 * close_l.size ** 2
+            block = np.empty((8, close_l.size, close_l.size, 27), dtype=np.int32)
+            block[0] = i
+            block[1] = alpha
+            block[2] = close_l[:, np.newaxis, np.newaxis]
+            block[3] = close_j[:, np.newaxis, np.newaxis]
+            block[4] = beta
+            block[5] = close_l[np.newaxis, :, np.newaxis]
+            block[6] = close_j[np.newaxis, :, np.newaxis]
+            block[7] = gamma
+            coords[:, cursor:cursor + n_block] = block.reshape((8, n_block))
+
+            # The values are always read from the first replica
+            reduced_index[cursor:cursor + n_block] = np.ravel_multi_index(
+                (i, alpha, 0, close_j[:, np.newaxis, np.newaxis], beta, 0, close_j[np.newaxis, :, np.newaxis], gamma),
+                shape).reshape(-1)
+            cursor += n_block
+        values = _take_flat(reduced_third, reduced_index)
 
         logging.info('Created unfolded third order')
 
-        shape = (n_unit_atoms, 3, n_replicas, n_unit_atoms, 3, n_replicas, n_unit_atoms, 3)
-        expanded_third = COO(np.array(coords).T, np.array(values), shape)
+        expanded_third = COO(coords, values, shape)
         expanded_third = expanded_third.reshape(
             (n_unit_atoms * 3, n_replicas * n_unit_atoms * 3, n_replicas * n_unit_atoms * 3))
         return expanded_third
@@ -1,14 +1,13 @@
 import numpy as np
 import os
-from sparse import COO
 from kaldo.helpers.logger import get_logger
 logging = get_logger()
 
-import pandas as pd
 import h5py
 
 LAZY_PREFIX = '_lazy__'
 FOLDER_NAME = 'data'
+MIN_BYTES_TO_MEMORY_MAP = 64 * 1024 ** 2
 
 # TODO: move this into single observables
 DEFAULT_STORE_FORMATS = {'physical_mode': 'formatted',
@@ -37,7 +36,11 @@ def load(property, folder, instance, format='formatted'):
     # TODO: move this into single observables
     name = folder + '/' + property
     if format == 'numpy':
-        loaded = np.load(name + '.npy', allow_pickle=True)
+        if os.path.getsize(name + '.npy') > MIN_BYTES_TO_MEMORY_MAP:
+            # Map big arrays copy-on-write, pages are read only when they are accessed
+            loaded = np.load(name + '.npy', mmap_mode='c')
+        else:
+            loaded = np.load(name + '.npy', allow_pickle=True)
         return loaded
     elif format == 'hdf5':
         with h5py.File(name.split('/')[0] + '.hdf5', 'r') as storage:
@@ -46,7 +49,7 @@ def load(property, folder, instance, format='formatted'):
     elif format == 'formatted':
         if property == 'physical_mode':
             loaded = np.loadtxt(name + '.dat', skiprows=1)
-            loaded = np.round(loaded, 0).astype(np.bool)
+            loaded = np.round(loaded, 0).astype(np.bool_)
         elif property == 'velocity':
             loaded = []
             for alpha in range(3):
@@ -66,13 +69,13 @@ def load(property, folder, instance, format='formatted'):
         elif '_sij' in property:
             loaded = []
             for alpha in range(3):
-                loaded.append(np.loadtxt(name + '_' + str(alpha) + '.dat', skiprows=1, dtype=np.complex))
+                loaded.append(np.loadtxt(name + '_' + str(alpha) + '.dat', skiprows=1, dtype=np.complex128))
             loaded = np.array(loaded).transpose(1, 0)
         else:
             if property == 'diffusivity':
-                dt = np.complex
+                dt = np.complex128
             else:
-                dt = np.float
+                dt = np.float64
             loaded = np.loadtxt(name + '.dat', skiprows=1, dtype=dt)
         return loaded
     elif format == 'memory':
@@ -90,8 +93,7 @@ def save(property, folder, loaded_attr, format='formatted'):
     # TODO: move this into single observables
     name = folder + '/' + property
     if format == 'numpy':
-        if not os.path.exists(folder):
-            os.makedirs(folder)
+        os.makedirs(folder, exist_ok=True)
         np.save(name + '.npy', loaded_attr)
         logging.info(name + ' stored')
     elif format == 'hdf5':
@@ -101,8 +103,7 @@ def save(property, folder, loaded_attr, format='formatted'):
         logging.info(name + ' stored')
     elif format == 'formatted':
         # loaded_attr = np.nan_to_num(loaded_attr)
-        if not os.path.exists(folder):
-            os.makedirs(folder)
+        os.makedirs(folder, exist_ok=True)
         if property == 'physical_mode':
             fmt = '%d'
         else:
@@ -148,6 +149,9 @@ def get_folder_from_label(instance, label='', base_folder=None):
             base_folder += '/single_q/' + str(q_point[0]) + '_' + str(q_point[1]) + '_' + str(q_point[2])
         except AttributeError:
             pass
+    # Single precision results are stored apart, so they never replace the double precision ones
+    if getattr(instance, 'is_single_precision', False):
+        base_folder += '/single_precision'
     if label != '':
         if '<diffusivity_bandwidth>' in label:
             if instance.diffusivity_bandwidth is not None:
@@ -210,11 +214,13 @@ def lazy_property(label=''):
                     logging.info('Loading ' + folder + '/' + str(property))
             else:
                 attr = LAZY_PREFIX + fn.__name__
-                if not hasattr(self, attr):
+                try:
+                    # Only the memory format reads the attribute back, with the other formats it may have been
+                    # attached by is_calculated and be stale
+                    loaded_attr = self.__dict__[attr]
+                except KeyError:
                     loaded_attr = fn(self)
                     setattr(self, attr, loaded_attr)
-                else:
-                    loaded_attr = getattr(self, attr)
             return loaded_attr
         __lazy_property.__doc__ = fn.__doc__
         return __lazy_property
@@ -5,6 +5,7 @@ Anharmonic Lattice Dynamics
 import numpy as np
 import time
 from itertools import takewhile, repeat
+from opt_einsum import contract_expression
 from kaldo.helpers.logger import get_logger
 logging = get_logger()
 
@@ -30,6 +31,15 @@ def count_rows(filename):
     return sum(buf.count(b'\n') for buf in bufgen if buf)
 
 
+_contract_expressions = {}
 
 
-
+def cached_contract(subscripts, *operands, backend='tensorflow'):
+    # Same as opt_einsum.contract, but the contraction path is found once for each subscripts and shapes
+    shapes = tuple(tuple(operand.shape) for operand in operands)
+    try:
+        expression = _contract_expressions[(subscripts, shapes)]
+    except KeyError:
+        expression = contract_expression(subscripts, *shapes)
+        _contract_expressions[(subscripts, shapes)] = expression
+    return expression(*operands, backend=backend)
@@ -4,11 +4,8 @@ Anharmonic Lattice Dynamics
 """
 import numpy as np
 from sparse import COO
-import pandas as pd
 import ase.units as units
-from kaldo.helpers.tools import count_rows
 from ase import Atoms
-import re
 from kaldo.helpers.logger import get_logger
 logging = get_logger()
 
@@ -75,8 +72,7 @@ def import_second(atoms, replicas=(1, 1, 1), filename='Dyn.form'):
 
 def import_dynamical_matrix(n_atoms, supercell=(1, 1, 1), filename='Dyn.form'):
     supercell = np.array(supercell)
-    dynamical_matrix_frame = pd.read_csv(filename, header=None, delim_whitespace=True)
-    dynamical_matrix = dynamical_matrix_frame.values
+    dynamical_matrix = np.loadtxt(filename, dtype=np.float64)
     n_replicas = np.prod(supercell)
     if dynamical_matrix.size == n_replicas * (n_atoms * 3) ** 2:
         dynamical_matrix = dynamical_matrix.reshape((n_atoms, 3, n_replicas, n_atoms, 3))
@@ -95,32 +91,19 @@ def import_sparse_third(atoms, supercell=(1, 1, 1), filename='THIRD', third_ener
     n_replicas = np.prod(supercell)
     n_atoms = atoms.get_positions().shape[0]
     n_replicated_atoms = n_atoms * n_replicas
-    n_rows = count_rows(filename)
-    array_size = min(n_rows * 3, n_atoms * 3 * (n_replicated_atoms * 3) ** 2)
-    coords = np.zeros((array_size, 6), dtype=np.int16)
-    values = np.zeros((array_size))
-    index_in_unit_cell = 0
     tenjovermoltoev = 10 * units.J / units.mol
+    # Each row holds five one based indices and the three components along the last axis
     with open(filename) as f:
-        for i, line in enumerate(f):
-            l_split = re.split('\s+', line.strip())
-            coords_to_write = np.array(l_split[0:-3], dtype=int) - 1
-            values_to_write = np.array(l_split[-3:], dtype=np.float)
-            #TODO: add 'if' third_energy_threshold before calculating the mask
-            mask_to_write = np.abs(values_to_write) > third_energy_threshold
-
-            if mask_to_write.any() and coords_to_write[0] < n_atoms:
-                for alpha in np.arange(3)[mask_to_write]:
-                    coords[index_in_unit_cell, :-1] = coords_to_write[np.newaxis, :]
-                    coords[index_in_unit_cell, -1] = alpha
-                    values[index_in_unit_cell] = values_to_write[alpha] * tenjovermoltoev
-                    index_in_unit_cell = index_in_unit_cell + 1
-            if i % 1000000 == 0:
-                logging.info('reading third order: ' + str(np.round(i / n_rows, 2) * 100) + '%')
-    logging.info('read ' + str(3 * i) + ' interactions')
-    coords = coords[:index_in_unit_cell].T
-    values = values[:index_in_unit_cell]
-    sparse_third = COO (coords, values, shape=(n_atoms, 3, n_replicated_atoms, 3, n_replicated_atoms, 3))
+        third = np.loadtxt(f, dtype=np.float64, ndmin=2)
+    logging.info('read ' + str(3 * third.shape[0]) + ' interactions')
+    indices = third[:, :5].astype(np.intp) - 1
+    values = third[:, 5:]
+    #TODO: add 'if' third_energy_threshold before calculating the mask
+    mask_to_write = (np.abs(values) > third_energy_threshold) & (indices[:, 0] < n_atoms)[:, np.newaxis]
+    rows, alpha = np.nonzero(mask_to_write)
+    coords = np.vstack((indices[rows].T, alpha))
+    sparse_third = COO(coords, values[rows, alpha] * tenjovermoltoev,
+                       shape=(n_atoms, 3, n_replicated_atoms, 3, n_replicated_atoms, 3))
     return sparse_third
 
 
@@ -130,10 +113,10 @@ def import_dense_third(atoms, supercell, filename, is_reduced=True):
     n_atoms = atoms.get_positions().shape[0]
     if is_reduced:
         total_rows = (n_atoms *  3) * (n_atoms * n_replicas * 3) ** 2
-        third = np.fromfile(filename, dtype=np.float, count=total_rows)
+        third = np.fromfile(filename, dtype=np.float64, count=total_rows)
         third = third.reshape((n_atoms, 3, n_atoms * n_replicas, 3, n_atoms * n_replicas, 3))
     else:
         total_rows = (n_atoms * n_replicas * 3) ** 3
-        third = np.fromfile(filename, dtype=np.float, count=total_rows)
+        third = np.fromfile(filename, dtype=np.float64, count=total_rows)
         third = third.reshape((n_atoms * n_replicas, 3, n_atoms * n_replicas, 3, n_atoms * n_replicas, 3))
     return third
@@ -3,7 +3,8 @@ from kaldo.observables.forceconstant import chi
 from kaldo.observables.observable import Observable
 import numpy as np
 from opt_einsum import contract
-from kaldo.helpers.storage import lazy_property
+from kaldo.helpers.storage import lazy_property, LAZY_PREFIX
+from kaldo.helpers.tools import cached_contract
 import tensorflow as tf
 from scipy.linalg.lapack import zheev
 from kaldo.helpers.logger import get_logger, log_size
@@ -19,6 +20,7 @@ class HarmonicWithQ(Observable):
                  storage='numpy',
                  is_nw=False,
                  is_unfolding=False,
+                 is_single_precision=False,
                  *kargs,
                  **kwargs):
         super().__init__(*kargs, **kwargs)
@@ -32,6 +34,8 @@ class HarmonicWithQ(Observable):
         self.physical_mode= np.ones((1, self.n_modes), dtype=bool)
         self.is_nw = is_nw
         self.is_unfolding = is_unfolding
+        self.is_single_precision = is_single_precision
+        self._chi_k_value = None
         if (q_point == [0, 0, 0]).all():
             if self.is_nw:
                 self.physical_mode[0, :4] = False
@@ -105,9 +109,19 @@ class HarmonicWithQ(Observable):
         return _sij
 
 
+    @property
+    def _chi_k(self):
+        # The phase factors of the replicas, shared by the dynamical matrix and its derivatives
+        if self._chi_k_value is None:
+            self._chi_k_value = chi(self.q_point, self.second.list_of_replicas, self.second.cell_inv)
+        return self._chi_k_value
+
+
     def calculate_frequency(self):
-        #TODO: replace calculate_eigensystem() with eigensystem
-        if self.is_unfolding:
+        if hasattr(self, LAZY_PREFIX + '_eigensystem'):
+            # Reuse the eigenvalues when the eigensystem is already in memory
+            eigenvals = np.real(getattr(self, LAZY_PREFIX + '_eigensystem')[0])
+        elif self.is_unfolding:
             eigenvals = self.calculate_eigensystem_unfolded(only_eigenvals=True)
         else:
             eigenvals = self.calculate_eigensystem(only_eigenvals=True)
@@ -115,14 +129,12 @@ class HarmonicWithQ(Observable):
         return frequency.real
 
     def calculate_dynmat_derivatives(self, direction):
-        q_point = self.q_point
         is_amorphous = self.is_amorphous
         distance_threshold = self.distance_threshold
         atoms = self.atoms
         list_of_replicas = self.second.list_of_replicas
         replicated_cell = self.second.replicated_atoms.cell
         replicated_cell_inv = self.second._replicated_cell_inv
-        cell_inv = self.second.cell_inv
         dynmat = self.second.dynmat
         positions = self.atoms.positions
         n_unit_cell = atoms.positions.shape[0]
@@ -130,9 +142,9 @@ class HarmonicWithQ(Observable):
         n_replicas = np.prod(self.supercell)
         shape = (1, n_unit_cell * 3, n_unit_cell * 3)
         if is_amorphous:
-            type = np.float
+            type = np.float64
         else:
-            type = np.complex
+            type = np.complex128
         dir = ['_x', '_y', '_z']
         log_size(shape, type, name='dynamical_matrix_derivative_' + dir[direction])
         if is_amorphous:
@@ -153,7 +165,7 @@ class HarmonicWithQ(Observable):
                     np.newaxis, :, :, :])
 
                 shape = (n_unit_cell, 3, n_unit_cell, 3)
-                type = np.complex
+                type = np.complex128
                 dynmat_derivatives = np.zeros(shape, dtype=type)
                 for l in range(n_replicas):
                     wrapped_distance = wrap_coordinates(distance_to_wrap[:, l, :, :], replicated_cell,
@@ -162,14 +174,13 @@ class HarmonicWithQ(Observable):
                     id_i, id_j = np.argwhere(mask).T
                     dynmat_derivatives[id_i, :, id_j, :, :] += contract('f,fbc->fbc', distance[id_i, l, id_j, direction], \
                                                                          dynmat.numpy()[0, id_i, :, 0, id_j, :] *
-                                                                         chi(q_point, list_of_replicas, cell_inv)[l])
+                                                                         self._chi_k[l])
             else:
 
-                dynmat_derivatives = contract('ilj,ibljc,l->ibjc',
-                                              tf.convert_to_tensor(distance.astype(np.complex)[..., direction]),
-                                              tf.cast(dynmat[0], tf.complex128),
-                                              tf.convert_to_tensor(chi(q_point, list_of_replicas, cell_inv).flatten().astype(np.complex)),
-                                              backend='tensorflow')
+                dynmat_derivatives = cached_contract('ilj,ibljc,l->ibjc',
+                                                     tf.convert_to_tensor(distance.astype(np.complex128)[..., direction]),
+                                                     tf.cast(dynmat[0], tf.complex128),
+                                                     tf.convert_to_tensor(self._chi_k.flatten()))
         dynmat_derivatives = tf.reshape(dynmat_derivatives, (n_modes, n_modes))
         return dynmat_derivatives
 
@@ -178,9 +189,9 @@ class HarmonicWithQ(Observable):
         is_amorphous = self.is_amorphous
         shape = (3 * self.atoms.positions.shape[0], 3 * self.atoms.positions.shape[0])
         if is_amorphous and (self.q_point == np.array([0, 0, 0])).all():
-            type = np.float
+            type = np.float64
         else:
-            type = np.complex
+            type = np.complex128
         eigenvects = self._eigensystem[1:, :]
         if direction == 0:
             dynmat_derivatives = self._dynmat_derivatives_x
@@ -214,8 +225,8 @@ class HarmonicWithQ(Observable):
                 sij = self._sij_y
             if alpha == 2:
                 sij = self._sij_z
-            velocity_AF = 1 / (2 * np.pi) * contract('mn,m,n->mn', sij,
-                                   inverse_sqrt_freq, inverse_sqrt_freq, backend='tensorflow') / 2
+            velocity_AF = 1 / (2 * np.pi) * cached_contract('mn,m,n->mn', sij,
+                                                            inverse_sqrt_freq, inverse_sqrt_freq) / 2
             velocity_AF = tf.where(tf.math.is_nan(tf.math.real(velocity_AF)), 0., velocity_AF)
             velocity[..., alpha] = contract('mm->m', velocity_AF.numpy().imag)
         return velocity[np.newaxis, ...]
@@ -227,15 +238,19 @@ class HarmonicWithQ(Observable):
         n_unit_cell = atoms.positions.shape[0]
         n_replicas = np.prod(self.supercell)
         dynmat = self.second.dynmat
-        cell_inv = self.second.cell_inv
         replicated_cell_inv = self.second._replicated_cell_inv
         is_at_gamma = (q_point == (0, 0, 0)).all()
         is_amorphous = (n_replicas == 1)
-        list_of_replicas = self.second.list_of_replicas
-        log_size((self.n_modes, self.n_modes), np.complex, name='dynmat_fourier')
+        log_size((self.n_modes, self.n_modes), np.complex128, name='dynmat_fourier')
         if distance_threshold is not None:
             shape = (n_unit_cell, 3, n_unit_cell, 3)
-            type = np.complex
+            if is_at_gamma:
+                # All the phases are one at gamma, the dynamical matrix stays real
+                type = np.float64
+                chi_k = np.ones(n_replicas)
+            else:
+                type = np.complex128
+                chi_k = self._chi_k
             dyn_s = np.zeros(shape, dtype=type)
             replicated_cell = self.second.replicated_atoms.cell
 
@@ -247,7 +262,7 @@ class HarmonicWithQ(Observable):
 
                 mask = np.linalg.norm(distance_to_wrap, axis=-1) < distance_threshold
                 id_i, id_j = np.argwhere(mask).T
-                dyn_s[id_i, :, id_j, :] += dynmat.numpy()[0, id_i, :, 0, id_j, :] * chi(q_point, list_of_replicas, cell_inv)[l]
+                dyn_s[id_i, :, id_j, :] += dynmat.numpy()[0, id_i, :, 0, id_j, :] * chi_k[l]
         else:
             if is_at_gamma:
                 if is_amorphous:
@@ -255,21 +270,27 @@ class HarmonicWithQ(Observable):
                 else:
                     dyn_s = contract('ialjb->iajb', dynmat[0], backend='tensorflow')
             else:
-                dyn_s = contract('ialjb,l->iajb',
-                                 tf.cast(dynmat[0], tf.complex128),
-                                 tf.convert_to_tensor(chi(q_point, list_of_replicas, cell_inv).flatten()),
-                                 backend='tensorflow')
+                dyn_s = cached_contract('ialjb,l->iajb',
+                                        tf.cast(dynmat[0], tf.complex128),
+                                        tf.convert_to_tensor(self._chi_k.flatten()))
         dyn_s = tf.reshape(dyn_s, (self.n_modes, self.n_modes))
         return dyn_s
 
     def calculate_eigensystem(self, only_eigenvals):
-        dyn_s = self._dynmat_fourier
+        dyn_s = tf.convert_to_tensor(self._dynmat_fourier)
+        dtype = dyn_s.dtype
+        if self.is_single_precision:
+            # Diagonalize in single precision, the result is cast back to the input type
+            dyn_s = tf.cast(dyn_s, tf.complex64 if dtype.is_complex else tf.float32)
         if only_eigenvals:
             esystem = tf.linalg.eigvalsh(dyn_s)
+            dtype = dtype.real_dtype
         else:
-            log_size(self._dynmat_fourier.shape, type=np.complex, name='eigensystem')
+            log_size(dyn_s.shape, type=np.complex128, name='eigensystem')
             esystem = tf.linalg.eigh(dyn_s)
             esystem = tf.concat(axis=0, values=(esystem[0][tf.newaxis, :], esystem[1]))
+        if self.is_single_precision:
+            esystem = tf.cast(esystem, dtype)
         return esystem
 
     def calculate_eigensystem_unfolded(self, only_eigenvals=False):
@@ -283,7 +304,7 @@ class HarmonicWithQ(Observable):
         fc_s = fc_s.reshape((n_unit_cell, 3, scell[0], scell[1], scell[2], n_unit_cell, 3))
         sc_r_pos = self.second.supercell_positions
         sc_r_pos_norm = 1 / 2 * np.linalg.norm(sc_r_pos, axis=1) ** 2
-        dyn_s = np.zeros((n_unit_cell, 3, n_unit_cell, 3), dtype=np.complex)
+        dyn_s = np.zeros((n_unit_cell, 3, n_unit_cell, 3), dtype=np.complex128)
         tt = self.second.supercell_replicas
         for ind in range(tt.shape[0]):
             t = tt[ind]
@@ -316,7 +337,7 @@ class HarmonicWithQ(Observable):
         atoms = self.atoms
         cell = atoms.cell
         n_unit_cell = atoms.positions.shape[0]
-        ddyn_s = np.zeros((n_unit_cell, 3, n_unit_cell, 3), dtype=np.complex)
+        ddyn_s = np.zeros((n_unit_cell, 3, n_unit_cell, 3), dtype=np.complex128)
         positions = atoms.positions
         fc_s = self.second.dynmat.numpy()
         fc_s = fc_s.reshape((n_unit_cell, 3, supercell[0], supercell[1], supercell[2], n_unit_cell, 3))
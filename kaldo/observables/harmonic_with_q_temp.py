@@ -3,6 +3,9 @@ import numpy as np
 import ase.units as units
 from kaldo.helpers.storage import lazy_property
 
+# Largest hbar omega / k_B T for which exp doesn't overflow in double precision
+MAX_REDUCED_ENERGY = np.log(np.finfo(np.float64).max)
+
 
 class HarmonicWithQTemp(HarmonicWithQ):
 
@@ -80,7 +83,10 @@ class HarmonicWithQTemp(HarmonicWithQ):
         temp = self.temperature * kelvintothz
         population = np.zeros_like(frequency)
         physical_mode = self.physical_mode.reshape(frequency.shape)
-        population[physical_mode] = 1. / (np.exp(frequency[physical_mode] / temp) - 1.)
+        reduced_energy = frequency / temp
+        # Above the exp overflow the population is zero, evaluate only the remaining modes
+        is_populated = physical_mode & (reduced_energy < MAX_REDUCED_ENERGY)
+        population[is_populated] = 1. / np.expm1(reduced_energy[is_populated])
         return population
 
 
@@ -26,8 +26,7 @@ class Observable:
             property_name = str(self)
         name = folder + '/' + property_name
         if format == 'numpy':
-            if not os.path.exists(folder):
-                os.makedirs(folder)
+            os.makedirs(folder, exist_ok=True)
             np.save(name + '.npy', loaded_attr)
             logging.info(name + ' stored')
         elif format == 'hdf5':
@@ -38,8 +37,7 @@ class Observable:
             logging.info(name + ' stored')
         elif format == 'formatted':
             # loaded_attr = np.nan_to_num(loaded_attr)
-            if not os.path.exists(folder):
-                os.makedirs(folder)
+            os.makedirs(folder, exist_ok=True)
             fmt = '%.18e'
             np.savetxt(name + '.dat', loaded_attr, fmt=fmt, header=str(loaded_attr.shape))
         elif format == 'memory':
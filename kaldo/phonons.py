@@ -6,16 +6,22 @@ Anharmonic Lattice Dynamics
 from kaldo.helpers.storage import is_calculated
 from kaldo.helpers.storage import lazy_property
 from kaldo.helpers.logger import log_size
-from kaldo.helpers.storage import DEFAULT_STORE_FORMATS, FOLDER_NAME
+from kaldo.helpers.storage import DEFAULT_STORE_FORMATS, FOLDER_NAME, LAZY_PREFIX
 from kaldo.grid import Grid
 from kaldo.observables.harmonic_with_q import HarmonicWithQ
 from kaldo.observables.harmonic_with_q_temp import HarmonicWithQTemp
 import kaldo.controllers.anharmonic as aha
 import numpy as np
+import tensorflow as tf
 import ase.units as units
 from kaldo.helpers.logger import get_logger
 logging = get_logger()
 
+# Dynamical matrices up to this size are diagonalized together, above it the call overhead is negligible
+MAX_N_MODES_TO_BATCH = 100
+# Number of q points diagonalized in each batch, which bounds the memory of the stacked matrices
+N_Q_POINTS_PER_BATCH = 64
+
 
 class Phonons:
     """The Phonons object exposes all the phononic properties of a system.
@@ -63,6 +69,12 @@ class Phonons:
         Default 'C'
     is_balanced : Enforce detailed balance when calculating anharmonic properties,
         Default: False
+    is_single_precision : bool, optional
+        Diagonalize the dynamical matrices in single precision, which halves
+        their memory traffic at the cost of less accurate eigenvectors and
+        frequencies. Not used when unfolding. The results are stored in a
+        separate single_precision folder.
+        Default: False
 
     Returns
     -------
@@ -78,10 +90,12 @@ class Phonons:
         self.kpts = kwargs.pop('kpts', (1, 1, 1))
         self._grid_type = kwargs.pop('grid_type', 'C')
         self._reciprocal_grid = Grid(self.kpts, order=self._grid_type)
+        self._grid_shape = np.asarray(self._reciprocal_grid.grid_shape, dtype=np.int32)
         self.is_unfolding = kwargs.pop('is_unfolding', False)
         if self.is_unfolding:
             logging.info('Using unfolding.')
         self.kpts = np.array(self.kpts)
+        self._is_amorphous = bool((self.kpts == (1, 1, 1)).all())
         self.min_frequency = kwargs.pop('min_frequency', 0)
         self.max_frequency = kwargs.pop('max_frequency', None)
         self.broadening_shape = kwargs.pop('broadening_shape', 'gauss')
@@ -91,13 +105,21 @@ class Phonons:
         self.is_symmetrizing_frequency = kwargs.pop('is_symmetrizing_frequency', False)
         self.is_antisymmetrizing_velocity = kwargs.pop('is_antisymmetrizing_velocity', False)
         self.is_balanced = kwargs.pop('is_balanced', False)
+        self.is_single_precision = kwargs.pop('is_single_precision', False)
         self.atoms = self.forceconstants.atoms
         self.supercell = np.array(self.forceconstants.supercell)
         self.n_k_points = int(np.prod(self.kpts))
         self.n_atoms = self.forceconstants.n_atoms
         self.n_modes = self.forceconstants.n_modes
+        self._distance_threshold = self.forceconstants.distance_threshold
         self.n_phonons = self.n_k_points * self.n_modes
         self.is_able_to_calculate = True
+        self._harmonic_properties = None
+        self._statistical_properties = None
+        self._statistics = None
+        self._unitary_q_points_value = None
+        self._qpp_vec_buffer = np.empty((self.n_k_points, 3))
+        self._rescaled_qpp_buffer = np.empty((self.n_k_points, 3), dtype=np.intp)
         self.hbar = units._hbar
         if self.is_classic:
             self.hbar = self.hbar * 1e-6
@@ -113,19 +135,7 @@ class Phonons:
         physical_mode : np array
             (n_k_points, n_modes) bool
         """
-        q_points = self._reciprocal_grid.unitary_grid(is_wrapping=False)
-        physical_mode = np.zeros((self.n_k_points, self.n_modes), dtype=np.bool)
-
-        for ik in range(len(q_points)):
-            q_point = q_points[ik]
-            phonon = HarmonicWithQ(q_point=q_point,
-                                   second=self.forceconstants.second,
-                                   distance_threshold=self.forceconstants.distance_threshold,
-                                   folder=self.folder,
-                                   storage=self.storage,
-                                   is_unfolding=self.is_unfolding)
-
-            physical_mode[ik] = phonon.physical_mode
+        physical_mode = self._pop_harmonic_property('physical_mode')
         if self.min_frequency is not None:
             physical_mode[self.frequency < self.min_frequency] = False
         if self.max_frequency is not None:
@@ -141,19 +151,7 @@ class Phonons:
         frequency : np array
             (n_k_points, n_modes) frequency in THz
         """
-        q_points = self._reciprocal_grid.unitary_grid(is_wrapping=False)
-        frequency = np.zeros((self.n_k_points, self.n_modes))
-        for ik in range(len(q_points)):
-            q_point = q_points[ik]
-            phonon = HarmonicWithQ(q_point=q_point,
-                                   second=self.forceconstants.second,
-                                   distance_threshold=self.forceconstants.distance_threshold,
-                                   folder=self.folder,
-                                   storage=self.storage,
-                                   is_unfolding=self.is_unfolding)
-
-            frequency[ik] = phonon.frequency
-
+        frequency = self._pop_harmonic_property('frequency')
         return frequency
 
 
@@ -166,18 +164,7 @@ class Phonons:
         velocity : np array
             (n_k_points, n_unit_cell * 3, 3) velocity in 100m/s or A/ps
         """
-
-        q_points = self._reciprocal_grid.unitary_grid(is_wrapping=False)
-        velocity = np.zeros((self.n_k_points, self.n_modes, 3))
-        for ik in range(len(q_points)):
-            q_point = q_points[ik]
-            phonon = HarmonicWithQ(q_point=q_point,
-                                   second=self.forceconstants.second,
-                                   distance_threshold=self.forceconstants.distance_threshold,
-                                   folder=self.folder,
-                                   storage=self.storage,
-                                   is_unfolding=self.is_unfolding)
-            velocity[ik] = phonon.velocity
+        velocity = self._pop_harmonic_property('velocity')
         return velocity
 
 
@@ -193,21 +180,7 @@ class Phonons:
 
             If the system is not amorphous, these values are stored as complex numbers.
         """
-        q_points = self._reciprocal_grid.unitary_grid(is_wrapping=False)
-        shape = (self.n_k_points, self.n_modes + 1, self.n_modes)
-        log_size(shape, name='eigensystem', type=np.complex)
-        eigensystem = np.zeros(shape, dtype=np.complex)
-        for ik in range(len(q_points)):
-            q_point = q_points[ik]
-            phonon = HarmonicWithQ(q_point=q_point,
-                                   second=self.forceconstants.second,
-                                   distance_threshold=self.forceconstants.distance_threshold,
-                                   folder=self.folder,
-                                   storage=self.storage,
-                                   is_unfolding=self.is_unfolding)
-
-            eigensystem[ik] = phonon._eigensystem
-
+        eigensystem = self._pop_harmonic_property('_eigensystem')
         return eigensystem
 
 
@@ -227,19 +200,7 @@ class Phonons:
         c_v : np.array(n_k_points, n_modes)
             heat capacity in W/m/K for each k point and each mode
         """
-        q_points = self._reciprocal_grid.unitary_grid(is_wrapping=False)
-        c_v = np.zeros((self.n_k_points, self.n_modes))
-        for ik in range(len(q_points)):
-            q_point = q_points[ik]
-            phonon = HarmonicWithQTemp(q_point=q_point,
-                                       second=self.forceconstants.second,
-                                       distance_threshold=self.forceconstants.distance_threshold,
-                                       folder=self.folder,
-                                       storage=self.storage,
-                                       temperature=self.temperature,
-                                       is_classic=self.is_classic,
-                                       is_unfolding=self.is_unfolding)
-            c_v[ik] = phonon.heat_capacity
+        c_v = self._pop_statistical_property('heat_capacity')
         return c_v
 
 
@@ -255,18 +216,19 @@ class Phonons:
         """
         q_points = self._reciprocal_grid.unitary_grid(is_wrapping=False)
         shape = (self.n_k_points, self.n_modes, self.n_modes)
-        log_size(shape, name='heat_capacity_2d', type=np.float)
+        log_size(shape, name='heat_capacity_2d', type=np.float64)
         heat_capacity_2d = np.zeros(shape)
         for ik in range(len(q_points)):
             q_point = q_points[ik]
             phonon = HarmonicWithQTemp(q_point=q_point,
                                        second=self.forceconstants.second,
-                                       distance_threshold=self.forceconstants.distance_threshold,
+                                       distance_threshold=self._distance_threshold,
                                        folder=self.folder,
                                        storage=self.storage,
                                        temperature=self.temperature,
                                        is_classic=self.is_classic,
-                                       is_unfolding=self.is_unfolding)
+                                       is_unfolding=self.is_unfolding,
+                                       is_single_precision=self.is_single_precision)
             heat_capacity_2d[ik] = phonon.heat_capacity_2d
         return heat_capacity_2d
 
@@ -282,19 +244,7 @@ class Phonons:
         population : np.array(n_k_points, n_modes)
             population for each k point and each mode
         """
-        q_points = self._reciprocal_grid.unitary_grid(is_wrapping=False)
-        population = np.zeros((self.n_k_points, self.n_modes))
-        for ik in range(len(q_points)):
-            q_point = q_points[ik]
-            phonon = HarmonicWithQTemp(q_point=q_point,
-                                       second=self.forceconstants.second,
-                                       distance_threshold=self.forceconstants.distance_threshold,
-                                       folder=self.folder,
-                                       storage=self.storage,
-                                       temperature=self.temperature,
-                                       is_classic=self.is_classic,
-                                       is_unfolding=self.is_unfolding)
-            population[ik] = phonon.population
+        population = self._pop_statistical_property('population')
         return population
 
 
@@ -356,7 +306,12 @@ class Phonons:
             if self.storage == 'formatted' else self.storage
         if is_calculated('_ps_gamma_and_gamma_tensor', self, '<temperature>/<statistics>/<third_bandwidth>', \
                          format=store_format):
-            ps_and_gamma = self._ps_gamma_and_gamma_tensor[:, :2]
+            # is_calculated attached the scattering tensor to the instance, copy the two columns out of it
+            attr = LAZY_PREFIX + '_ps_gamma_and_gamma_tensor'
+            ps_and_gamma = np.ascontiguousarray(getattr(self, attr)[:, :2])
+            if store_format != 'memory':
+                # The tensor was loaded from disk only to be sliced, release it
+                delattr(self, attr)
         else:
             ps_and_gamma = self._select_algorithm_for_phase_space_and_gamma(is_gamma_tensor_enabled=False)
         return ps_and_gamma
@@ -369,6 +324,163 @@ class Phonons:
 
 # Helpers properties
 
+    def _calculate_harmonic_properties(self, is_calculating_eigensystem=False, is_calculating_velocity=False):
+        """Calculate physical modes, frequency and, optionally, eigensystem and velocity in a single pass over the
+        k points, so that the dynamical matrix of each k point is Fourier transformed and diagonalized once.
+
+        Parameters
+        ----------
+        is_calculating_eigensystem : bool
+            if True the eigensystem is returned too, otherwise only the eigenvalues are calculated
+        is_calculating_velocity : bool
+            if True the velocity is returned too
+
+        Returns
+        -------
+        harmonic_properties : dict
+            the arrays returned by the physical_mode, frequency, _eigensystem and velocity getters
+        """
+        q_points = self._reciprocal_grid.unitary_grid(is_wrapping=False)
+        physical_mode = np.zeros((self.n_k_points, self.n_modes), dtype=np.bool_)
+        frequency = np.zeros((self.n_k_points, self.n_modes))
+        if is_calculating_eigensystem:
+            shape = (self.n_k_points, self.n_modes + 1, self.n_modes)
+            log_size(shape, name='eigensystem', type=np.complex128)
+            eigensystem = np.zeros(shape, dtype=np.complex128)
+        else:
+            eigensystem = None
+        if is_calculating_velocity:
+            velocity = np.zeros((self.n_k_points, self.n_modes, 3))
+        # Small dynamical matrices are diagonalized together, each on its own the call overhead dominates
+        is_batching = not (is_calculating_velocity or self.is_unfolding) and self.n_modes <= MAX_N_MODES_TO_BATCH
+        batched_ks = []
+        batched_dynmats = []
+        for ik in range(len(q_points)):
+            q_point = q_points[ik]
+            phonon = HarmonicWithQ(q_point=q_point,
+                                   second=self.forceconstants.second,
+                                   distance_threshold=self._distance_threshold,
+                                   folder=self.folder,
+                                   storage=self.storage,
+                                   is_unfolding=self.is_unfolding,
+                                   is_single_precision=self.is_single_precision)
+            physical_mode[ik] = phonon.physical_mode
+            if is_batching and not (q_point == 0).all():
+                # Away from gamma the dynamical matrices are complex, gamma keeps its real diagonalization
+                batched_ks.append(ik)
+                batched_dynmats.append(phonon._dynmat_fourier)
+                if len(batched_ks) == N_Q_POINTS_PER_BATCH:
+                    self._diagonalize_batch(batched_ks, batched_dynmats, frequency, eigensystem)
+                    batched_ks = []
+                    batched_dynmats = []
+                continue
+            if is_calculating_eigensystem or is_calculating_velocity:
+                # The frequency is taken from the eigenvalues in the first row of the eigensystem
+                phonon_eigensystem = phonon._eigensystem
+                eigenvals = np.real(phonon_eigensystem[0])
+                frequency[ik] = np.abs(eigenvals) ** .5 * np.sign(eigenvals) / (np.pi * 2.)
+                if is_calculating_eigensystem:
+                    eigensystem[ik] = phonon_eigensystem
+                if is_calculating_velocity:
+                    velocity[ik] = phonon.velocity
+            else:
+                frequency[ik] = phonon.frequency
+        if batched_ks:
+            self._diagonalize_batch(batched_ks, batched_dynmats, frequency, eigensystem)
+        harmonic_properties = {'physical_mode': physical_mode,
+                               'frequency': frequency}
+        if is_calculating_eigensystem:
+            harmonic_properties['_eigensystem'] = eigensystem
+        if is_calculating_velocity:
+            harmonic_properties['velocity'] = velocity
+        return harmonic_properties
+
+
+    def _diagonalize_batch(self, batched_ks, batched_dynmats, frequency, eigensystem=None):
+        """Diagonalize the dynamical matrices of a batch of k points together and write the results in place.
+
+        Parameters
+        ----------
+        batched_ks : list
+            indices of the k points in the batch
+        batched_dynmats : list
+            the dynamical matrices of the k points in the batch
+        frequency : np.array
+            (n_k_points, n_modes) frequencies, filled at the batched k points
+        eigensystem : np.array
+            (n_k_points, n_modes + 1, n_modes) eigensystem, filled at the batched k points when given,
+            otherwise only the eigenvalues are calculated
+        """
+        batched_dynmats = tf.stack(batched_dynmats)
+        if self.is_single_precision:
+            batched_dynmats = tf.cast(batched_dynmats, tf.complex64)
+        if eigensystem is not None:
+            eigenvals, eigenvects = tf.linalg.eigh(batched_dynmats)
+            eigensystem[batched_ks, 1:, :] = eigenvects.numpy()
+        else:
+            eigenvals = tf.linalg.eigvalsh(batched_dynmats)
+        eigenvals = np.real(eigenvals.numpy())
+        if eigensystem is not None:
+            eigensystem[batched_ks, 0, :] = eigenvals
+        frequency[batched_ks] = np.abs(eigenvals) ** .5 * np.sign(eigenvals) / (np.pi * 2.)
+
+
+    def _pop_harmonic_property(self, name):
+        # Each array is handed over to its getter only once, and released here afterwards. The eigensystem and the
+        # velocity are only calculated when they are requested
+        if self._harmonic_properties is None or name not in self._harmonic_properties:
+            self._harmonic_properties = self._calculate_harmonic_properties(
+                is_calculating_eigensystem=(name == '_eigensystem'),
+                is_calculating_velocity=(name == 'velocity'))
+        harmonic_property = self._harmonic_properties.pop(name)
+        if not self._harmonic_properties:
+            self._harmonic_properties = None
+        return harmonic_property
+
+
+    def _calculate_statistical_properties(self):
+        """Calculate population and heat capacity in a single pass over the k points, so that the frequencies of each
+        k point are calculated once for both.
+
+        Returns
+        -------
+        statistical_properties : dict
+            the arrays returned by the population and heat_capacity getters
+        """
+        q_points = self._reciprocal_grid.unitary_grid(is_wrapping=False)
+        population = np.zeros((self.n_k_points, self.n_modes))
+        c_v = np.zeros((self.n_k_points, self.n_modes))
+        for ik in range(len(q_points)):
+            q_point = q_points[ik]
+            phonon = HarmonicWithQTemp(q_point=q_point,
+                                       second=self.forceconstants.second,
+                                       distance_threshold=self._distance_threshold,
+                                       folder=self.folder,
+                                       storage=self.storage,
+                                       temperature=self.temperature,
+                                       is_classic=self.is_classic,
+                                       is_unfolding=self.is_unfolding,
+                                       is_single_precision=self.is_single_precision)
+            # The heat capacity reuses the population of the same phonon
+            population[ik] = phonon.population
+            c_v[ik] = phonon.heat_capacity
+        return {'population': population,
+                'heat_capacity': c_v}
+
+
+    def _pop_statistical_property(self, name):
+        # Same as _pop_harmonic_property, but the arrays depend on the temperature and statistics too
+        statistics = (self.temperature, self.is_classic)
+        if self._statistical_properties is None or self._statistics != statistics \
+                or name not in self._statistical_properties:
+            self._statistical_properties = self._calculate_statistical_properties()
+            self._statistics = statistics
+        statistical_property = self._statistical_properties.pop(name)
+        if not self._statistical_properties:
+            self._statistical_properties = None
+        return statistical_property
+
+
     @property
     def omega(self):
         """Calculates the angular frequencies from the diagonalized dynamical matrix.
@@ -385,27 +497,34 @@ class Phonons:
     def _rescaled_eigenvectors(self):
         n_atoms = self.n_atoms
         n_modes = self.n_modes
-        masses = self.atoms.get_masses()
-        rescaled_eigenvectors = self.eigenvectors[:, :, :].reshape(
-            (self.n_k_points, n_atoms, 3, n_modes)) / np.sqrt(
-            masses[np.newaxis, :, np.newaxis, np.newaxis])
+        # Multiply by the inverse square roots, computed once per atom rather than divided for each entry
+        inv_sqrt_masses = 1 / np.sqrt(self.atoms.get_masses())
+        rescaled_eigenvectors = self.eigenvectors.reshape((self.n_k_points, n_atoms, 3, n_modes)) * \
+                                inv_sqrt_masses[np.newaxis, :, np.newaxis, np.newaxis]
         rescaled_eigenvectors = rescaled_eigenvectors.reshape((self.n_k_points, n_modes, n_modes))
         return rescaled_eigenvectors
 
 
     @property
-    def _is_amorphous(self):
-        is_amorphous = (self.kpts == (1, 1, 1)).all()
-        return is_amorphous
+    def _unitary_q_points(self):
+        # The q points in reduced coordinates, in the order of their index on the reciprocal grid
+        if self._unitary_q_points_value is None:
+            self._unitary_q_points_value = self._reciprocal_grid.unitary_grid(is_wrapping=False)
+        return self._unitary_q_points_value
 
 
     def _allowed_third_phonons_index(self, index_q, is_plus):
-        q_vec = self._reciprocal_grid.id_to_unitary_grid_index(index_q)
-        qp_vec = self._reciprocal_grid.unitary_grid(is_wrapping=False)
-        qpp_vec = q_vec[np.newaxis, :] + (int(is_plus) * 2 - 1) * qp_vec[:, :]
-        rescaled_qpp = np.round((qpp_vec * self._reciprocal_grid.grid_shape), 0).astype(np.int)
-        rescaled_qpp = np.mod(rescaled_qpp, self._reciprocal_grid.grid_shape)
-        index_qpp_full = np.ravel_multi_index(rescaled_qpp.T, self._reciprocal_grid.grid_shape, mode='raise',
+        qp_vec = self._unitary_q_points
+        # Work in the preallocated buffers, only the returned indices are allocated
+        qpp_vec = self._qpp_vec_buffer
+        rescaled_qpp = self._rescaled_qpp_buffer
+        np.multiply(qp_vec, int(is_plus) * 2 - 1, out=qpp_vec)
+        np.add(qpp_vec, qp_vec[index_q], out=qpp_vec)
+        np.multiply(qpp_vec, self._grid_shape, out=qpp_vec)
+        np.rint(qpp_vec, out=qpp_vec)
+        np.copyto(rescaled_qpp, qpp_vec, casting='unsafe')
+        np.mod(rescaled_qpp, self._grid_shape, out=rescaled_qpp)
+        index_qpp_full = np.ravel_multi_index(rescaled_qpp.T, self._grid_shape, mode='raise',
                                               order=self._grid_type)
         return index_qpp_full
 
@@ -8,13 +8,19 @@ from kaldo.phonons import Phonons
 import numpy as np
 import pytest
 
-# NOTE: the scope of this fixture needs to be 'function' for these tests to work properly.
-@pytest.yield_fixture(scope="function")
-def phonons():
-    print ("Preparing phonons object.")
+@pytest.yield_fixture(scope="session")
+def forceconstants():
+    print ("Preparing forceconstants object.")
 
     # Create a finite difference object
     forceconstants = ForceConstants.from_folder(folder='kaldo/tests/si-amorphous', format='eskm')
+    return forceconstants
+
+
+# NOTE: the scope of this fixture needs to be 'function' for these tests to work properly.
+@pytest.yield_fixture(scope="function")
+def phonons(forceconstants):
+    print ("Preparing phonons object.")
 
     # # Create a phonon object
     phonons = Phonons(forceconstants=forceconstants,
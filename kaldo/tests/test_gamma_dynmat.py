@@ -0,0 +1,31 @@
+"""
+Unit and regression test for the kaldo package.
+"""
+
+# Import package, test suite, and other packages as needed
+from kaldo.forceconstants import ForceConstants
+from kaldo.observables.harmonic_with_q import HarmonicWithQ
+import numpy as np
+import pytest
+
+
+@pytest.yield_fixture(scope="session")
+def forceconstants():
+    print ("Preparing forceconstants object.")
+    forceconstants = ForceConstants.from_folder(folder='kaldo/tests/si-crystal',
+                                                supercell=[3, 3, 3],
+                                                format='eskm',
+                                                distance_threshold=4.)
+    return forceconstants
+
+
+def test_gamma_frequency(forceconstants):
+    # The real gamma path must agree with the phase aware path at an equivalent q point
+    frequencies = []
+    for q_point in (np.array([0., 0., 0.]), np.array([1., 0., 0.])):
+        phonon = HarmonicWithQ(q_point=q_point,
+                               second=forceconstants.second,
+                               distance_threshold=forceconstants.distance_threshold,
+                               storage='memory')
+        frequencies.append(phonon.frequency)
+    np.testing.assert_array_almost_equal(frequencies[0], frequencies[1], decimal=4)
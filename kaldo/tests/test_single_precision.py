@@ -0,0 +1,42 @@
+"""
+Unit and regression test for the kaldo package.
+"""
+
+# Import package, test suite, and other packages as needed
+from kaldo.forceconstants import ForceConstants
+from kaldo.helpers.storage import get_folder_from_label
+import numpy as np
+from kaldo.phonons import Phonons
+import pytest
+
+
+@pytest.yield_fixture(scope="session")
+def forceconstants():
+    print ("Preparing forceconstants object.")
+    forceconstants = ForceConstants.from_folder(folder='kaldo/tests/si-crystal',
+                                                supercell=[3, 3, 3],
+                                                format='eskm')
+    return forceconstants
+
+
+def create_phonons(forceconstants, is_single_precision):
+    phonons = Phonons(forceconstants=forceconstants,
+                      kpts=[3, 3, 3],
+                      is_classic=False,
+                      temperature=300,
+                      storage='memory',
+                      is_single_precision=is_single_precision)
+    return phonons
+
+
+def test_single_precision_frequency(forceconstants):
+    double_frequency = create_phonons(forceconstants, is_single_precision=False).frequency
+    single_frequency = create_phonons(forceconstants, is_single_precision=True).frequency
+    np.testing.assert_array_almost_equal(single_frequency, double_frequency, decimal=1)
+
+
+def test_single_precision_folder(forceconstants):
+    # Results of the two precisions must never share their storage folder
+    double_folder = get_folder_from_label(create_phonons(forceconstants, is_single_precision=False), '<q_point>')
+    single_folder = get_folder_from_label(create_phonons(forceconstants, is_single_precision=True), '<q_point>')
+    assert double_folder != single_folder
@@ -0,0 +1,56 @@
+"""
+Unit and regression test for the kaldo package.
+"""
+
+# Import package, test suite, and other packages as needed
+from kaldo.forceconstants import ForceConstants
+from kaldo.grid import wrap_coordinates
+import numpy as np
+import pytest
+
+
+DISTANCE_THRESHOLD = 2.5
+
+
+@pytest.yield_fixture(scope="session")
+def forceconstants():
+    print ("Preparing forceconstants object.")
+    forceconstants = ForceConstants.from_folder(folder='kaldo/tests/si-crystal',
+                                                supercell=[3, 3, 3],
+                                                format='eskm')
+    return forceconstants
+
+
+def reference_unfold_third_order(forceconstants, reduced_third, distance_threshold):
+    # Straightforward assembly of the unfolded third order, one entry at a time
+    n_unit_atoms = forceconstants.n_atoms
+    n_replicas = forceconstants.n_replicas
+    replicated_atoms = forceconstants.third.replicated_atoms
+    reduced_third = reduced_third.reshape(
+        (n_unit_atoms, 3, n_replicas, n_unit_atoms, 3, n_replicas, n_unit_atoms, 3))
+    replicated_positions = replicated_atoms.positions.reshape((n_replicas, n_unit_atoms, 3))
+    dxij_reduced = wrap_coordinates(forceconstants.atoms.positions[:, np.newaxis, np.newaxis, :]
+                                    - replicated_positions[np.newaxis, :, :, :], replicated_atoms.cell)
+    expanded_third = np.zeros_like(reduced_third)
+    for index in np.argwhere(np.linalg.norm(dxij_reduced, axis=-1) < distance_threshold):
+        for l in range(n_replicas):
+            for j in range(n_unit_atoms):
+                if np.linalg.norm(dxij_reduced[index[0], l, j]) < distance_threshold:
+                    expanded_third[index[0], :, index[1], index[2], :, l, j, :] = \
+                        reduced_third[index[0], :, 0, index[2], :, 0, j, :]
+    return expanded_third.reshape(
+        (n_unit_atoms * 3, n_replicas * n_unit_atoms * 3, n_replicas * n_unit_atoms * 3))
+
+
+def test_unfold_sparse_third_order(forceconstants):
+    reduced_third = forceconstants.third.value
+    expected = reference_unfold_third_order(forceconstants, reduced_third.todense(), DISTANCE_THRESHOLD)
+    unfolded_third = forceconstants.unfold_third_order(reduced_third, distance_threshold=DISTANCE_THRESHOLD)
+    np.testing.assert_array_almost_equal(unfolded_third.todense(), expected)
+
+
+def test_unfold_dense_third_order(forceconstants):
+    reduced_third = forceconstants.third.value.todense()
+    expected = reference_unfold_third_order(forceconstants, reduced_third, DISTANCE_THRESHOLD)
+    unfolded_third = forceconstants.unfold_third_order(reduced_third, distance_threshold=DISTANCE_THRESHOLD)
+    np.testing.assert_array_almost_equal(unfolded_third.todense(), expected)